@@ -1,94 +1,250 @@
 # app.py
 import streamlit as st
-import json
 import time
+import math
 import os
 import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 
-import googlemaps
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+try:
+    import orjson as fast_json
+except ImportError:  # orjson is optional; the stdlib module has the same dumps/loads shape
+    import json as fast_json
+
+# googlemaps, requests and gspread are imported inside the cached factories below, so the
+# first page render doesn't wait on them; python caches the modules after the first import
 
 # app title and page configuration
 st.set_page_config(page_title="Plateful", page_icon="🍽️")
 st.title("🍽️ Plateful - Food Distribution Agent")
 
+# patterns used on every chat turn, compiled once
+INTENT_RE = re.compile(r'\b(?:find|donate|where can)', re.IGNORECASE)
+LOCATION_RE = re.compile(r'\bin\s+(.+)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
 # initialize session state for chat history and context
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "context" not in st.session_state:
     st.session_state.context = {}
+if "state" not in st.session_state:
+    st.session_state.state = "idle"
 if "cached_orgs" not in st.session_state:
     st.session_state.cached_orgs = []
 
 
+# shared googlemaps client, reused across searches so its connection pool stays warm
+@st.cache_resource(show_spinner=False)
+def _get_gmaps_client(api_key):
+    import googlemaps
+    return googlemaps.Client(key=api_key, timeout=5)
+
+
+# shared http session for the places api (new), keeping tls connections alive between searches
+@st.cache_resource(show_spinner=False)
+def _get_http_session():
+    import requests
+    return requests.Session()
+
+
+# cached geocode lookup, keyed on the normalized location string
+@st.cache_data(ttl=24 * 60 * 60, max_entries=512, show_spinner=False)
+def _geocode(_gmaps, location_key):
+    return _gmaps.geocode(location_key)
+
+
+# places api (new) text search; the field mask returns contact details in the same response
+PLACES_SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
+PLACES_FIELD_MASK = ",".join([
+    "places.displayName",
+    "places.shortFormattedAddress",
+    "places.internationalPhoneNumber",
+    "places.websiteUri",
+    "places.rating",
+])
+# extra candidates are fetched in the same request so low-rated ones can be dropped
+PLACES_CANDIDATES = 10
+MAX_RECIPIENTS = 5
+MIN_RATING = 3.5
+# text search (new) only accepts a rectangle as a hard restriction, so the 8 km radius becomes a box
+SEARCH_RADIUS_M = 8000
+METERS_PER_DEGREE_LAT = 111320
+
+
+# bounding box extending SEARCH_RADIUS_M from the center in each direction
+def _search_box(lat, lng):
+    dlat = SEARCH_RADIUS_M / METERS_PER_DEGREE_LAT
+    dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return {
+        "low": {"latitude": lat - dlat, "longitude": lng - dlng},
+        "high": {"latitude": lat + dlat, "longitude": lng + dlng},
+    }
+
+
+# cached places search, keyed on coordinates rounded to ~100 m so small jitter still hits
+@st.cache_data(ttl=24 * 60 * 60, max_entries=512, show_spinner=False)
+def _search_places(_api_key, lat, lng):
+    response = _get_http_session().post(
+        PLACES_SEARCH_URL,
+        headers={
+            "Content-Type": "application/json",
+            "X-Goog-Api-Key": _api_key,
+            "X-Goog-FieldMask": PLACES_FIELD_MASK,
+        },
+        data=fast_json.dumps({
+            "textQuery": "food bank OR charity OR food donation",
+            "pageSize": PLACES_CANDIDATES,
+            "locationRestriction": {"rectangle": _search_box(lat, lng)},
+        }),
+        timeout=10,
+    )
+    response.raise_for_status()
+    return fast_json.loads(response.content)
+
+
+# on-disk cache of search results per normalized location, so restarts don't repeat the searches
+CACHE_DB_PATH = "plateful_cache.sqlite"
+ORG_CACHE_TTL = 24 * 60 * 60
+
+
+@st.cache_resource(show_spinner=False)
+def _get_cache_db():
+    conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS orgs (loc TEXT PRIMARY KEY, payload BLOB, ts INTEGER)")
+    conn.commit()
+    return conn, threading.Lock()
+
+
+# the cache is only an optimization: read failures count as a miss and write failures are ignored
+def _load_cached_orgs(location_key):
+    try:
+        conn, lock = _get_cache_db()
+        with lock:
+            row = conn.execute(
+                "SELECT payload FROM orgs WHERE loc = ? AND ts > ?", (location_key, int(time.time()) - ORG_CACHE_TTL)
+            ).fetchone()
+        return fast_json.loads(row[0]) if row else None
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def _store_cached_orgs(location_key, recipients):
+    try:
+        conn, lock = _get_cache_db()
+        with lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO orgs (loc, payload, ts) VALUES (?, ?, ?)",
+                (location_key, fast_json.dumps(recipients), int(time.time()))
+            )
+    except sqlite3.Error:
+        pass
+
+
 # helper function to find nearby ngos
 def find_recipients(location: str):
     """Searches for organizations using Google Places API."""
     try:
+        location_key = WHITESPACE_RE.sub(' ', location.strip().lower())
+        cached_recipients = _load_cached_orgs(location_key)
+        if cached_recipients:
+            return {"recipients": cached_recipients}
+
         api_key = st.secrets["connections"]["gcp"]["GOOGLE_API_KEY"]
-        gmaps = googlemaps.Client(key=api_key)
-        geocode_result = gmaps.geocode(location)
+        gmaps = _get_gmaps_client(api_key)
+        geocode_result = _geocode(gmaps, location_key)
         if not geocode_result:
             return {"error": f"Could not find coordinates for '{location}'"}
 
         lat_lng = geocode_result[0]['geometry']['location']
-        places_result = gmaps.places_nearby(
-            location=lat_lng, radius=8000, keyword='food bank OR charity OR food donation'
-        )
+        places_result = _search_places(api_key, round(lat_lng['lat'], 3), round(lat_lng['lng'], 3))
 
-        detailed_recipients = []
-        for place in places_result.get('results', [])[:5]:
-            place_id = place.get('place_id')
-            if not place_id: continue
+        # skip places rated below MIN_RATING, unrated places are kept; fall back to the unfiltered list
+        places = places_result.get('places', [])
+        candidates = [place for place in places if place.get('rating', MIN_RATING) >= MIN_RATING] or places
 
-            details = gmaps.place(
-                place_id=place_id,
-                fields=['name', 'vicinity', 'formatted_phone_number', 'website', 'rating']
-            )
-            place_details = details.get('result', {})
+        detailed_recipients = []
+        for place in candidates[:MAX_RECIPIENTS]:
             detailed_recipients.append({
-                "name": place_details.get('name', 'N/A'),
-                "address": place_details.get('vicinity', 'N/A'),
-                "phone": place_details.get('formatted_phone_number', 'Not available'),
-                "website": place_details.get('website', 'Not available'),
+                "name": place.get('displayName', {}).get('text', 'N/A'),
+                "address": place.get('shortFormattedAddress', 'N/A'),
+                "phone": place.get('internationalPhoneNumber', 'Not available'),
+                "website": place.get('websiteUri', 'Not available'),
             })
 
+        if detailed_recipients:
+            _store_cached_orgs(location_key, detailed_recipients)
+
         return {"recipients": detailed_recipients} if detailed_recipients else {"message": "No organizations found."}
     except Exception as e:
         return {"api_error": True, "error": str(e)}
 
 
+SHEET_HEADERS = ["Donor Name", "Donor Phone", "NGO Name", "NGO Phone", "NGO Website", "Timestamp"]
+
+
+# authorized gspread client, created once per process and reused across logs
+@st.cache_resource(show_spinner=False)
+def _get_gspread_client():
+    import gspread
+
+    # use local service_account file if it exists, otherwise use streamlit secrets
+    if os.path.exists("service_account.json"):
+        return gspread.service_account(filename="service_account.json")
+
+    creds_json = dict(st.secrets["connections"]["gcp"]["service_account"])
+    return gspread.service_account_from_dict(creds_json)
+
+
+# opened worksheet per spreadsheet id; the header row is checked only when it is first opened
+@st.cache_resource(show_spinner=False)
+def _get_worksheet(spreadsheet_id):
+    sheet = _get_gspread_client().open_by_key(spreadsheet_id).sheet1
+
+    # add headers if the sheet is empty
+    if not sheet.row_values(1):
+        sheet.append_row(SHEET_HEADERS)
+
+    return sheet
+
+
+# shared worker pool for background prefetches, so slow setup overlaps with the user typing
+@st.cache_resource(show_spinner=False)
+def _background_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+
+# opens the logging sheet ahead of time; any failure resurfaces when the request is logged
+def _prefetch_worksheet():
+    spreadsheet_id = st.secrets["connections"]["gcp"]["GOOGLE_SHEET_ID"]
+    _get_worksheet(spreadsheet_id)
+
+
 # helper function to log donation requests to google sheets
 def log_donation_request(user_name, user_phone, organizations):
     """Logs a donation request to a Google Sheet using the best available credentials."""
-    try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    if not organizations:
+        return {"error": "There are no organizations to log."}
 
-        # use local service_account file if it exists, otherwise use streamlit secrets
-        if os.path.exists("service_account.json"):
-            creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
-        else:
-            creds_json = dict(st.secrets["connections"]["gcp"]["service_account"])
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, scopes=scope)
-
-        client = gspread.authorize(creds)
+    try:
         spreadsheet_id = st.secrets["connections"]["gcp"]["GOOGLE_SHEET_ID"]
-        sheet = client.open_by_key(spreadsheet_id).sheet1
+        sheet = _get_worksheet(spreadsheet_id)
 
         timestamp = time.ctime()
-        rows_to_add = []
-        for org in organizations:
-            rows_to_add.append(
-                [user_name, user_phone, org.get('name', 'N/A'), org.get('phone', 'N/A'), org.get('website', 'N/A'),
-                 timestamp])
-
-        # add headers if the sheet is empty
-        if not sheet.get_all_values():
-            sheet.append_row(["Donor Name", "Donor Phone", "NGO Name", "NGO Phone", "NGO Website", "Timestamp"])
-
-        if rows_to_add:
-            sheet.append_rows(rows_to_add)
+        # extract each ngo column once, then zip them with the repeated donor columns into rows
+        names = [org.get('name', 'N/A') for org in organizations]
+        phones = [org.get('phone', 'N/A') for org in organizations]
+        websites = [org.get('website', 'N/A') for org in organizations]
+        rows_to_add = [
+            list(row) for row in zip(repeat(user_name), repeat(user_phone), names, phones, websites, repeat(timestamp))
+        ]
+
+        sheet.append_rows(
+            rows_to_add, value_input_option='RAW', insert_data_option='INSERT_ROWS', table_range='A1'
+        )
 
         return {"success": True, "message": "Request logged successfully!"}
     except Exception as e:
@@ -98,71 +254,90 @@ def log_donation_request(user_name, user_phone, organizations):
 # helper function to format the ngo data for display
 def format_organizations(orgs_data):
     """Formats the organization data for display."""
-    response = ""
+    parts = []
     for i, org in enumerate(orgs_data, 1):
-        response += f"**{i}. {org['name']}**\n\n"
-        response += f"   - **Address**: {org.get('address', 'N/A')}\n\n"
-        response += f"   - **Phone**: {org.get('phone', 'Not available')}\n\n"
-        response += f"   - **Website**: {org.get('website', 'Not available')}\n\n"
-    return response
+        parts.append(f"**{i}. {org['name']}**\n\n")
+        parts.append(f"   - **Address**: {org.get('address', 'N/A')}\n\n")
+        parts.append(f"   - **Phone**: {org.get('phone', 'Not available')}\n\n")
+        parts.append(f"   - **Website**: {org.get('website', 'Not available')}\n\n")
+    return "".join(parts)
 
 
-# main chat logic handler
-def process_message(user_message):
-    """Processes user message and manages conversation state."""
-    message_lower = user_message.lower().strip()
+# resets the conversation back to the initial search state
+def _reset_conversation():
+    st.session_state.context = {}
+    st.session_state.state = "idle"
+
+
+# conversation state handlers, one per step of the donation flow
+def _handle_idle(user_message):
+    if not INTENT_RE.search(user_message):
+        return "I can help you find food donation centers. Please tell me your city, like 'Where can I donate in Delhi?'"
+
+    location_match = LOCATION_RE.search(user_message)
+    if not location_match:
+        return "I can help with that! Please tell me the city you're in, for example: 'I want to donate in Delhi'."
+
+    location = location_match.group(1).strip()
+    with st.spinner(f"Searching for organizations in {location}..."):
+        result_data = find_recipients(location)
+
+    if "recipients" in result_data and result_data["recipients"]:
+        st.session_state.cached_orgs = result_data["recipients"]
+        response = f"I found these organizations in {location}:\n\n"
+        response += format_organizations(st.session_state.cached_orgs)
+        response += "\n\n**Would you like me to log this request for you? (yes/no)**"
+        st.session_state.state = "awaiting_log_confirmation"
+        return response
+    else:
+        return f"I'm sorry, I couldn't find any organizations. Error: {result_data.get('error', 'Unknown issue')}"
+
+
+def _handle_log_confirmation(user_message):
+    if user_message.lower().strip() == 'yes':
+        st.session_state.state = "awaiting_user_name"
+
+        # open the sheet in the background while the user types their name and phone
+        _background_executor().submit(_prefetch_worksheet)
+        return "Great! To proceed, please provide your name."
+    else:
+        _reset_conversation()
+        return "Okay, I won't log this request. Is there anything else I can help you with?"
+
+
+def _handle_user_name(user_message):
+    st.session_state.context['user_name'] = user_message
+    st.session_state.state = "awaiting_user_phone"
+    return "Thank you. Now, what is your phone number?"
+
+
+def _handle_user_phone(user_message):
     context = st.session_state.context
+    context['user_phone'] = user_message
 
-    # state machine for conversation flow
-    if context.get('awaiting_user_name'):
-        context['user_name'] = user_message
-        context['awaiting_user_name'] = False
-        context['awaiting_user_phone'] = True
-        return "Thank you. Now, what is your phone number?"
-
-    if context.get('awaiting_user_phone'):
-        context['user_phone'] = user_message
-
-        with st.spinner("Logging your request to Google Sheets..."):
-            log_result = log_donation_request(
-                context.get('user_name'),
-                context.get('user_phone'),
-                st.session_state.cached_orgs
-            )
+    with st.spinner("Logging your request to Google Sheets..."):
+        log_result = log_donation_request(
+            context.get('user_name'),
+            context.get('user_phone'),
+            st.session_state.cached_orgs
+        )
 
-        st.session_state.context = {} # reset context after logging
-        return f"✅ {log_result['message']}" if log_result.get('success') else f"❌ Error: {log_result['error']}"
-
-    if context.get('awaiting_log_confirmation'):
-        if message_lower == 'yes':
-            context['awaiting_log_confirmation'] = False
-            context['awaiting_user_name'] = True
-            return "Great! To proceed, please provide your name."
-        else:
-            st.session_state.context = {}
-            return "Okay, I won't log this request. Is there anything else I can help you with?"
-
-    # initial search handler
-    if "find" in message_lower or "donate" in message_lower or "where can" in message_lower:
-        location_match = re.search(r'in\s(.+)', user_message, re.IGNORECASE)
-        if not location_match:
-            return "I can help with that! Please tell me the city you're in, for example: 'I want to donate in Delhi'."
-
-        location = location_match.group(1).strip()
-        with st.spinner(f"Searching for organizations in {location}..."):
-            result_data = find_recipients(location)
-
-        if "recipients" in result_data and result_data["recipients"]:
-            st.session_state.cached_orgs = result_data["recipients"]
-            response = f"I found these organizations in {location}:\n\n"
-            response += format_organizations(st.session_state.cached_orgs)
-            response += "\n\n**Would you like me to log this request for you? (yes/no)**"
-            context['awaiting_log_confirmation'] = True
-            return response
-        else:
-            return f"I'm sorry, I couldn't find any organizations. Error: {result_data.get('error', 'Unknown issue')}"
-
-    return "I can help you find food donation centers. Please tell me your city, like 'Where can I donate in Delhi?'"
+    _reset_conversation() # reset context after logging
+    return f"✅ {log_result['message']}" if log_result.get('success') else f"❌ Error: {log_result['error']}"
+
+
+STATE_HANDLERS = {
+    "idle": _handle_idle,
+    "awaiting_log_confirmation": _handle_log_confirmation,
+    "awaiting_user_name": _handle_user_name,
+    "awaiting_user_phone": _handle_user_phone,
+}
+
+
+# main chat logic handler
+def process_message(user_message):
+    """Processes user message and manages conversation state."""
+    return STATE_HANDLERS[st.session_state.state](user_message)
 
 
 # render chat history and handle new input